@@ -13,10 +13,15 @@ from http.server import HTTPServer, BaseHTTPRequestHandler
 import threading
 import logging
 import shutil
-from discord import ButtonStyle
-from discord.ui import Button, View
+import time
+import aiohttp
+from discord import ButtonStyle, app_commands
+from discord.ui import Button, Select, View
 from async_timeout import timeout
 import datetime
+import json
+import math
+from collections import Counter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -50,6 +55,39 @@ FFMPEG_OPTIONS = {
     'options': '-vn -af "volume=0.5"'
 }
 
+# Read-ahead buffering (optional): fetch the stream ourselves and pipe it into ffmpeg
+READAHEAD_ENABLED = os.getenv('READAHEAD_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+READAHEAD_CHUNK_SIZE = int(os.getenv('READAHEAD_CHUNK_SIZE', 64 * 1024))
+READAHEAD_BUFFER_CHUNKS = int(os.getenv('READAHEAD_BUFFER_CHUNKS', 32))
+READAHEAD_PREFILL_CHUNKS = int(os.getenv('READAHEAD_PREFILL_CHUNKS', 4))
+READAHEAD_PREFILL_TIMEOUT = 10
+READAHEAD_RANGE_SIZE = int(os.getenv('READAHEAD_RANGE_SIZE', 1024 * 1024))
+READAHEAD_MAX_CONNECTIONS = int(os.getenv('READAHEAD_MAX_CONNECTIONS', 20))
+READAHEAD_MAX_RETRIES = 5
+
+# ffmpeg reads from stdin when fed by the read-ahead buffer, so no reconnect flags
+FFMPEG_PIPE_OPTIONS = {
+    'options': FFMPEG_OPTIONS['options']
+}
+
+# Shared sources (optional): one encoder per track, fanned out to every guild playing it
+SHARED_SOURCE_ENABLED = os.getenv('SHARED_SOURCE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+SHARED_SOURCE_WINDOW = int(os.getenv('SHARED_SOURCE_WINDOW', 60))
+SHARED_SOURCE_TRIM_FRAMES = 500
+SHARED_SOURCE_READY_TIMEOUT = 30
+
+# Local index of resolved tracks, consulted before searching YouTube
+TRACK_INDEX_ENABLED = os.getenv('TRACK_INDEX_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+TRACK_INDEX_PATH = os.getenv('TRACK_INDEX_PATH', 'track_index.json')
+TRACK_INDEX_MIN_SCORE = float(os.getenv('TRACK_INDEX_MIN_SCORE', 0.85))
+TRACK_INDEX_MIN_COVERAGE = float(os.getenv('TRACK_INDEX_MIN_COVERAGE', 0.6))
+TRACK_INDEX_MIN_MARGIN = 0.05
+TRACK_INDEX_FLUSH_INTERVAL = 30
+TRACK_INDEX_NOISE_WORDS = {
+    'official', 'music', 'video', 'audio', 'lyric', 'lyrics', 'hd', 'hq', '4k',
+    'visualizer', 'remastered', 'remaster', 'ft', 'feat', 'mv'
+}
+
 # Configure Spotify API (optional)
 SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
 SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
@@ -70,13 +108,564 @@ intents.voice_states = True
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
+# Slash commands only need syncing when they change, and syncing is rate limited
+SYNC_SLASH_COMMANDS = os.getenv('SYNC_SLASH_COMMANDS', 'false').lower() in ('1', 'true', 'yes')
+
+class MusicBot(commands.Bot):
+    async def setup_hook(self):
+        """Register the slash commands with Discord when asked to"""
+        if not SYNC_SLASH_COMMANDS:
+            return
+        try:
+            synced = await self.tree.sync()
+            logger.info(f"Synced {len(synced)} slash commands")
+        except discord.HTTPException as e:
+            # Prefix commands still work, so don't let a failed sync stop the bot
+            logger.error(f"Error syncing slash commands: {str(e)}")
+
+    async def close(self):
+        """Close the pooled HTTP session and save the track index before shutting down"""
+        if http_session and not http_session.closed:
+            await http_session.close()
+        if track_index:
+            await track_index.flush()
+        await super().close()
+
+bot = MusicBot(command_prefix='!', intents=intents, help_command=None)
 
 # Add status variables
 bot.uptime = None
 bot.reconnect_attempts = 0
 MAX_RECONNECT_ATTEMPTS = 5
 
+# Shared HTTP client for read-ahead streams (created lazily on the bot loop)
+http_session = None
+
+async def get_http_session():
+    """Return the pooled aiohttp session used by read-ahead streams"""
+    global http_session
+    if http_session is None or http_session.closed:
+        connector = aiohttp.TCPConnector(limit=READAHEAD_MAX_CONNECTIONS)
+        http_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+        )
+    return http_session
+
+class ReadAheadStats:
+    """Counters shared by every read-ahead stream, reported by !status"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.streams = 0
+        self.bytes_fetched = 0
+        self.underruns = 0
+        self.stall_time = 0.0
+        self.retries = 0
+
+    def add(self, **counters):
+        with self.lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+readahead_stats = ReadAheadStats()
+
+class ReadAheadBuffer:
+    """Bounded ring buffer filled from an HTTP stream and drained by ffmpeg's stdin writer"""
+    def __init__(self, url, headers=None, chunk_size=READAHEAD_CHUNK_SIZE, depth=READAHEAD_BUFFER_CHUNKS):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.chunk_size = chunk_size
+        self.depth = depth
+        # Slots are allocated once and overwritten in place for the whole stream
+        self._slots = [bytearray(chunk_size) for _ in range(depth)]
+        self._views = [memoryview(slot) for slot in self._slots]
+        self._lengths = [0] * depth
+        self._head = 0
+        self._tail = 0
+        self._count = 0
+        self._read_offset = 0
+        self._fill_len = 0
+        self._position = 0
+        self._eof = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._space = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._loop = None
+        self._task = None
+
+    def start(self):
+        """Start fetching on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._fill())
+        readahead_stats.add(streams=1)
+
+    async def wait_ready(self):
+        """Wait until the prefill target is buffered or the stream has ended"""
+        try:
+            async with timeout(READAHEAD_PREFILL_TIMEOUT):
+                await self._ready.wait()
+        except asyncio.TimeoutError:
+            logger.warning("Read-ahead prefill timed out, starting playback anyway")
+
+    def _available(self):
+        # With nothing published, the reader can still drain the slot being filled
+        return self._count or self._fill_len > self._read_offset
+
+    def read(self, size=-1):
+        """Blocking read used by ffmpeg's stdin writer thread"""
+        freed = False
+        with self._cond:
+            if not self._available() and not self._eof and not self._closed:
+                started = time.monotonic()
+                while not self._available() and not self._eof and not self._closed:
+                    self._cond.wait()
+                readahead_stats.add(underruns=1, stall_time=time.monotonic() - started)
+
+            if self._closed or not self._available():
+                return b''
+
+            # When nothing is published the head slot is the one being filled
+            length = self._lengths[self._head] if self._count else self._fill_len
+            end = length if size < 0 else min(self._read_offset + size, length)
+            data = bytes(self._views[self._head][self._read_offset:end])
+            self._read_offset = end
+            if self._count and self._read_offset >= length:
+                self._head = (self._head + 1) % self.depth
+                self._count -= 1
+                self._read_offset = 0
+                freed = True
+
+        if freed:
+            try:
+                self._loop.call_soon_threadsafe(self._space.set)
+            except RuntimeError:
+                pass  # Event loop already closed
+        return data
+
+    def close(self):
+        """Stop fetching and wake up any blocked reader"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._task and not self._task.done():
+            try:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+            except RuntimeError:
+                pass
+
+    async def _wait_for_space(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise asyncio.CancelledError()
+                if self._count < self.depth:
+                    return
+                self._space.clear()
+            await self._space.wait()
+
+    def _publish(self):
+        with self._cond:
+            self._lengths[self._tail] = self._fill_len
+            self._tail = (self._tail + 1) % self.depth
+            self._count += 1
+            self._fill_len = 0
+            self._cond.notify()
+            if self._count >= min(READAHEAD_PREFILL_CHUNKS, self.depth):
+                self._ready.set()
+
+    async def _write(self, data):
+        view = memoryview(data)
+        while view:
+            if not self._fill_len:
+                await self._wait_for_space()
+            n = min(len(view), self.chunk_size - self._fill_len)
+            self._views[self._tail][self._fill_len:self._fill_len + n] = view[:n]
+            with self._cond:
+                self._fill_len += n
+                self._cond.notify()
+            view = view[n:]
+            if self._fill_len == self.chunk_size:
+                self._publish()
+
+    async def _drain(self, response, skip=0):
+        """Copy a response body into the ring, advancing the stream position per chunk"""
+        async for data in response.content.iter_chunked(self.chunk_size):
+            if skip:
+                if len(data) <= skip:
+                    skip -= len(data)
+                    continue
+                data = data[skip:]
+                skip = 0
+            await self._write(data)
+            # Count bytes as soon as they are in the ring so a retry resumes after them
+            self._position += len(data)
+            readahead_stats.add(bytes_fetched=len(data))
+
+    @staticmethod
+    def _parse_total(content_range):
+        """Parse the total size out of a 'bytes start-end/total' header"""
+        if not content_range or '/' not in content_range:
+            return None
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+
+    async def _fill(self):
+        """Fetch the stream in ranged chunks until EOF, close or too many failures"""
+        total = None
+        retries = 0
+        try:
+            session = await get_http_session()
+            while not self._closed and (total is None or self._position < total):
+                position = self._position
+                end = position + READAHEAD_RANGE_SIZE - 1
+                if total is not None:
+                    end = min(end, total - 1)
+                requested = end - position + 1
+                headers = dict(self.headers, Range=f'bytes={position}-{end}')
+                try:
+                    async with session.get(self.url, headers=headers) as response:
+                        if response.status == 416:
+                            break
+                        response.raise_for_status()
+                        if response.status != 206:
+                            # Server ignored the range, so stream the rest of the body in one go
+                            await self._drain(response, skip=position)
+                            break
+                        total = self._parse_total(response.headers.get('Content-Range')) or total
+                        await self._drain(response)
+                    received = self._position - position
+                    if not received:
+                        raise aiohttp.ClientPayloadError("Empty range response")
+                    retries = 0
+                    if total is None and received < requested:
+                        break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    retries += 1
+                    readahead_stats.add(retries=1)
+                    if retries > READAHEAD_MAX_RETRIES:
+                        logger.error(f"Read-ahead giving up at byte {self._position}: {str(e)}")
+                        break
+                    logger.warning(f"Read-ahead retry {retries}/{READAHEAD_MAX_RETRIES}: {str(e)}")
+                    await asyncio.sleep(min(2 ** retries, 5))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Read-ahead error: {str(e)}")
+        finally:
+            with self._cond:
+                if self._fill_len and not self._closed:
+                    self._lengths[self._tail] = self._fill_len
+                    self._tail = (self._tail + 1) % self.depth
+                    self._count += 1
+                    self._fill_len = 0
+                self._eof = True
+                self._cond.notify_all()
+            self._ready.set()
+
+class BufferedFFmpegOpusAudio(discord.FFmpegOpusAudio):
+    """FFmpegOpusAudio fed through stdin from a ReadAheadBuffer"""
+    def __init__(self, buffer, **kwargs):
+        self.buffer = buffer
+        super().__init__(buffer, pipe=True, **kwargs)
+
+    def cleanup(self):
+        self.buffer.close()
+        super().cleanup()
+
+# Active shared encoders keyed by track URL
+shared_encoders = {}
+
+class SharedEncoder:
+    """Runs one Opus source and keeps its frames for every subscribed guild"""
+    def __init__(self, key):
+        self.key = key
+        self.source = None
+        self.failed = False
+        self.ready = asyncio.Event()
+        self.started_at = time.monotonic()
+        self._frames = []
+        self._base = 0
+        self._positions = {}
+        self._done = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._loop = asyncio.get_running_loop()
+
+    def joinable(self):
+        """Late joiners may reuse the frames while inside the window"""
+        return (not self.failed and not self._stopped
+                and time.monotonic() - self.started_at < SHARED_SOURCE_WINDOW)
+
+    @property
+    def listeners(self):
+        return len(self._positions)
+
+    def start(self, source):
+        """Start pulling frames from the underlying source on a worker thread"""
+        self.source = source
+        threading.Thread(target=self._run, daemon=True, name=f'shared-encoder:{self.key}').start()
+        self.ready.set()
+
+    def fail(self):
+        self.failed = True
+        if shared_encoders.get(self.key) is self:
+            del shared_encoders[self.key]
+        self.ready.set()
+
+    def subscribe(self):
+        source = SharedOpusSource(self)
+        with self._cond:
+            self._positions[id(source)] = 0
+        return source
+
+    def unsubscribe(self, source):
+        with self._cond:
+            self._positions.pop(id(source), None)
+            if self._positions:
+                return
+        # Keep the frames around for late joiners until the window closes
+        remaining = max(0, SHARED_SOURCE_WINDOW - (time.monotonic() - self.started_at))
+        try:
+            self._loop.call_soon_threadsafe(self._loop.call_later, remaining, self._expire)
+        except RuntimeError:
+            self._expire()
+
+    def read_frame(self, source, position):
+        """Blocking read of the frame at position, b'' once the track is over"""
+        with self._cond:
+            while position - self._base >= len(self._frames) and not self._done and not self._stopped:
+                self._cond.wait()
+            if self._stopped or position - self._base >= len(self._frames):
+                return b''
+            frame = self._frames[position - self._base]
+            self._positions[id(source)] = position + 1
+            self._trim()
+            return frame
+
+    def _trim(self):
+        # Once nobody new can join, drop frames every subscriber has already played
+        if self.joinable() or not self._positions:
+            return
+        consumed = min(self._positions.values()) - self._base
+        if consumed >= SHARED_SOURCE_TRIM_FRAMES:
+            del self._frames[:consumed]
+            self._base += consumed
+
+    def _expire(self):
+        with self._cond:
+            if self._positions:
+                return
+            self._stopped = True
+            self._frames.clear()
+            self._cond.notify_all()
+        if shared_encoders.get(self.key) is self:
+            del shared_encoders[self.key]
+
+    def _run(self):
+        try:
+            while not self._stopped:
+                frame = self.source.read()
+                if not frame:
+                    break
+                with self._cond:
+                    self._frames.append(frame)
+                    self._cond.notify_all()
+        except Exception as e:
+            logger.error(f"Shared encoder error: {str(e)}")
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+            self.source.cleanup()
+
+class SharedOpusSource(discord.AudioSource):
+    """Per-guild reader over a SharedEncoder, tracking its own position"""
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.position = 0
+        self._closed = False
+
+    def read(self):
+        frame = self.encoder.read_frame(self, self.position)
+        if frame:
+            self.position += 1
+        return frame
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if not self._closed:
+            self._closed = True
+            self.encoder.unsubscribe(self)
+
+class TrackIndex:
+    """Persistent trigram index over every track resolved so far"""
+    def __init__(self, path):
+        self.path = path
+        self.tracks = {}
+        self._postings = {}
+        self._grams = {}
+        self._title_grams = {}
+        self._dirty = False
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.lookup_time = 0.0
+        self.load()
+
+    @staticmethod
+    def _ngrams(text, skip=()):
+        """Trigrams of each word, padded so word boundaries count"""
+        grams = set()
+        for token in re.findall(r'\w+', text.lower()):
+            if token in skip:
+                continue
+            padded = f' {token} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    def _index(self, video_id):
+        self._unindex(video_id)
+        track = self.tracks[video_id]
+        grams = self._ngrams(f"{track['title']} {track['channel']}")
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(video_id)
+        self._grams[video_id] = grams
+        self._title_grams[video_id] = self._ngrams(track['title'], skip=TRACK_INDEX_NOISE_WORDS)
+
+    def _unindex(self, video_id):
+        # Drop the grams of a previous title so it stops matching
+        for gram in self._grams.pop(video_id, ()):
+            postings = self._postings.get(gram)
+            if postings:
+                postings.discard(video_id)
+                if not postings:
+                    del self._postings[gram]
+        self._title_grams.pop(video_id, None)
+
+    def load(self):
+        """Load tracks from disk and rebuild the postings"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for track in json.load(f):
+                    self.tracks[track['video_id']] = track
+                    self._index(track['video_id'])
+            logger.info(f"Loaded {len(self.tracks)} tracks into the local index")
+        except Exception as e:
+            logger.error(f"Error loading track index: {str(e)}")
+
+    def _write(self, tracks):
+        """Write the index atomically so a crash never leaves a partial file"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(tracks, f)
+        os.replace(tmp_path, self.path)
+
+    async def flush(self):
+        """Write pending changes to disk off the event loop"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            tracks = [dict(track) for track in self.tracks.values()]
+            try:
+                await asyncio.to_thread(self._write, tracks)
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"Error saving track index: {str(e)}")
+
+    async def _flush_later(self):
+        await asyncio.sleep(TRACK_INDEX_FLUSH_INTERVAL)
+        await self.flush()
+
+    def _mark_dirty(self):
+        # Batch writes so plays and searches never wait on the disk
+        self._dirty = True
+        if not self._flush_task or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    def add(self, song_info, duration):
+        """Add or refresh a resolved track"""
+        video_id = song_info.get('video_id')
+        if not video_id:
+            return
+        existing = self.tracks.get(video_id)
+        self.tracks[video_id] = {
+            'video_id': video_id,
+            'title': song_info['title'],
+            'channel': song_info['channel'],
+            'duration': duration,
+            'url': song_info['url'],
+            'thumbnail': song_info.get('thumbnail'),
+            'play_count': existing['play_count'] if existing else 0
+        }
+        if not existing or existing['title'] != song_info['title'] or existing['channel'] != song_info['channel']:
+            self._index(video_id)
+        self._mark_dirty()
+
+    def record_play(self, video_id):
+        track = self.tracks.get(video_id)
+        if track:
+            track['play_count'] += 1
+            self._mark_dirty()
+
+    def search(self, query, limit=1):
+        """Return confident local matches in the same shape as search_youtube
+
+        Returns an empty list unless there are at least limit confident matches,
+        and for a single result the best match must also beat the runner-up.
+        """
+        started = time.perf_counter()
+        query_grams = self._ngrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+
+        ranked = []
+        for video_id, count in shared.items():
+            # Containment: how much of the query the track covers
+            containment = count / len(query_grams)
+            if containment < TRACK_INDEX_MIN_SCORE:
+                continue
+            # Coverage: how much of the title (minus filler like "official video") the query covers,
+            # so a single common word does not match every cached title containing it
+            title_grams = self._title_grams[video_id]
+            coverage = len(query_grams & title_grams) / len(title_grams) if title_grams else 0
+            if coverage < TRACK_INDEX_MIN_COVERAGE:
+                continue
+            popularity = math.log1p(self.tracks[video_id]['play_count'])
+            ranked.append(((containment + coverage) / 2 + 0.01 * popularity, video_id))
+        ranked.sort(reverse=True)
+
+        if len(ranked) < limit:
+            ranked = []
+        elif limit == 1 and len(ranked) > 1 and ranked[0][0] - ranked[1][0] < TRACK_INDEX_MIN_MARGIN:
+            ranked = []
+
+        results = []
+        for _, video_id in ranked[:limit]:
+            track = self.tracks[video_id]
+            results.append({
+                'title': track['title'],
+                'url': track['url'],
+                'duration': str(datetime.timedelta(seconds=track['duration'])),
+                'thumbnail': track['thumbnail'],
+                'channel': track['channel'],
+                'video_id': video_id
+            })
+
+        self.lookups += 1
+        self.hits += bool(results)
+        self.lookup_time += time.perf_counter() - started
+        return results
+
+track_index = TrackIndex(TRACK_INDEX_PATH) if TRACK_INDEX_ENABLED else None
+
 class MusicControlsView(View):
     def __init__(self, music_player, ctx):
         super().__init__(timeout=None)
@@ -200,9 +789,15 @@ class MusicPlayer:
     async def search_youtube(self, query, limit=1):
         """Search YouTube for a query and return top results"""
         try:
+            # Songs resolved before are answered locally without a network call
+            if track_index:
+                results = track_index.search(query, limit)
+                if results:
+                    return results
+
             search_query = f"ytsearch{limit}:{query}"
             with yt_dlp.YoutubeDL(YDL_OPTIONS) as ydl:
-                info = ydl.extract_info(search_query, download=False)
+                info = await asyncio.to_thread(ydl.extract_info, search_query, download=False)
                 if not info or 'entries' not in info:
                     return []
                 
@@ -214,78 +809,129 @@ class MusicPlayer:
                             'url': entry.get('webpage_url', None),
                             'duration': str(datetime.timedelta(seconds=entry.get('duration', 0))),
                             'thumbnail': entry.get('thumbnail', None),
-                            'channel': entry.get('uploader', 'Unknown')
+                            'channel': entry.get('uploader', 'Unknown'),
+                            'video_id': entry.get('id')
                         })
+                        if track_index:
+                            track_index.add(results[-1], entry.get('duration') or 0)
                 return results
         except Exception as e:
             logger.error(f"Search error: {str(e)}")
             return []
 
-    async def process_url(self, url, ctx):
-        """Process URL and add to queue"""
-        try:
-            # Detect platform
-            platform = self.detect_platform(url)
+    async def resolve_url(self, url, ctx):
+        """Resolve a URL or search query and add it to the queue, returning the last song added"""
+        queued = len(self.queue)
+
+        # Detect platform
+        platform = self.detect_platform(url)
+        
+        if platform == 'spotify':
+            songs = await self.process_spotify(url)
+            if not songs:
+                await ctx.send("❌ Could not process Spotify URL")
+                return None
             
-            if platform == 'spotify':
-                songs = await self.process_spotify(url)
-                if not songs:
-                    await ctx.send("❌ Could not process Spotify URL")
-                    return
-                
-                for song in songs:
-                    # Search for each song on YouTube
-                    results = await self.search_youtube(song, limit=1)
-                    if results:
-                        self.queue.append(results[0])
-                    else:
-                        await ctx.send(f"⚠️ Could not find: {song}")
-                
-            else:
-                # Direct YouTube/SoundCloud URL or search query
-                if not url.startswith(('http://', 'https://')):
-                    # It's a search query
-                    results = await self.search_youtube(url, limit=1)
-                    if not results:
-                        await ctx.send("❌ No results found!")
-                        return
+            for song in songs:
+                # Search for each song on YouTube
+                results = await self.search_youtube(song, limit=1)
+                if results:
                     self.queue.append(results[0])
                 else:
-                    # It's a direct URL
-                    try:
-                        with yt_dlp.YoutubeDL(YDL_OPTIONS) as ydl:
-                            info = ydl.extract_info(url, download=False)
-                            if not info:
-                                await ctx.send("❌ Could not process URL")
-                                return
-                            
-                            song_info = {
-                                'title': info.get('title', 'Unknown Title'),
-                                'url': info.get('webpage_url', url),
-                                'duration': str(datetime.timedelta(seconds=info.get('duration', 0))),
-                                'thumbnail': info.get('thumbnail', None),
-                                'channel': info.get('uploader', 'Unknown'),
-                                'platform': info.get('extractor', 'Unknown')
-                            }
-                            self.queue.append(song_info)
-                    except Exception as e:
-                        logger.error(f"URL processing error: {str(e)}")
-                        await ctx.send(f"❌ Error processing URL: {str(e)}")
-                        return
+                    await ctx.send(f"⚠️ Could not find: {song}")
+            
+        else:
+            # Direct YouTube/SoundCloud URL or search query
+            if not url.startswith(('http://', 'https://')):
+                # It's a search query
+                results = await self.search_youtube(url, limit=1)
+                if not results:
+                    await ctx.send("❌ No results found!")
+                    return None
+                self.queue.append(results[0])
+            else:
+                # It's a direct URL
+                try:
+                    with yt_dlp.YoutubeDL(YDL_OPTIONS) as ydl:
+                        info = await asyncio.to_thread(ydl.extract_info, url, download=False)
+                        if not info:
+                            await ctx.send("❌ Could not process URL")
+                            return None
+                        
+                        song_info = {
+                            'title': info.get('title', 'Unknown Title'),
+                            'url': info.get('webpage_url', url),
+                            'duration': str(datetime.timedelta(seconds=info.get('duration', 0))),
+                            'thumbnail': info.get('thumbnail', None),
+                            'channel': info.get('uploader', 'Unknown'),
+                            'platform': info.get('extractor', 'Unknown'),
+                            'video_id': info.get('id') if platform == 'youtube' else None
+                        }
+                        self.queue.append(song_info)
+                        if track_index:
+                            track_index.add(song_info, info.get('duration') or 0)
+                except Exception as e:
+                    logger.error(f"URL processing error: {str(e)}")
+                    await ctx.send(f"❌ Error processing URL: {str(e)}")
+                    return None
 
-            # Create embed for queue addition
-            song_info = self.queue[-1]
-            embed = discord.Embed(
-                title="Added to Queue",
-                description=f"[{song_info['title']}]({song_info['url']})",
-                color=discord.Color.green()
+        if len(self.queue) == queued:
+            return None
+        return self.queue[-1]
+
+    def create_queued_embed(self, song_info):
+        embed = discord.Embed(
+            title="Added to Queue",
+            description=f"[{song_info['title']}]({song_info['url']})",
+            color=discord.Color.green()
+        )
+        embed.add_field(name="Channel", value=song_info['channel'], inline=True)
+        embed.add_field(name="Duration", value=song_info['duration'], inline=True)
+        if song_info.get('thumbnail'):
+            embed.set_thumbnail(url=song_info['thumbnail'])
+        return embed
+
+    def create_queue_embed(self):
+        """Build the queue listing, or None when nothing is playing or queued"""
+        if not self.queue and not self.current_song:
+            return None
+
+        embed = discord.Embed(
+            title="Music Queue",
+            color=discord.Color.blue()
+        )
+
+        if self.current_song:
+            embed.add_field(
+                name="Now Playing",
+                value=f"[{self.current_song['title']}]({self.current_song['url']})",
+                inline=False
             )
-            embed.add_field(name="Channel", value=song_info['channel'], inline=True)
-            embed.add_field(name="Duration", value=song_info['duration'], inline=True)
-            if song_info.get('thumbnail'):
-                embed.set_thumbnail(url=song_info['thumbnail'])
-            
-            await ctx.send(embed=embed)
+
+        if self.queue:
+            queue_text = ""
+            for i, song in enumerate(self.queue, 1):
+                if i > 10:  # Show only first 10 songs
+                    queue_text += f"\nAnd {len(self.queue) - 10} more songs..."
+                    break
+                queue_text += f"\n{i}. [{song['title']}]({song['url']})"
+
+            embed.add_field(
+                name="Up Next",
+                value=queue_text,
+                inline=False
+            )
+        return embed
+
+    async def process_url(self, url, ctx):
+        """Process URL and add to queue"""
+        try:
+            song_info = await self.resolve_url(url, ctx)
+            if not song_info:
+                return
+
+            # Create embed for queue addition
+            await ctx.send(embed=self.create_queued_embed(song_info))
             
             # Start playing if not already playing
             if not ctx.voice_client.is_playing():
@@ -298,31 +944,71 @@ class MusicPlayer:
     async def create_source(self, ctx, url):
         """Create an audio source from URL"""
         try:
-            with yt_dlp.YoutubeDL(YDL_OPTIONS) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if not info:
-                    raise ValueError("Could not extract audio information")
-                
-                # Get the direct audio URL
-                if 'formats' in info:
-                    formats = info['formats']
-                    # Try to get best audio-only format
-                    audio_formats = [f for f in formats if f.get('acodec') != 'none' and f.get('vcodec') == 'none']
-                    if audio_formats:
-                        url = audio_formats[0]['url']
-                    else:
-                        url = info['url']
-                else:
-                    url = info['url']
+            if not SHARED_SOURCE_ENABLED:
+                return await self.create_ffmpeg_source(url)
+
+            # Reuse the encoder of a guild that started this track recently
+            encoder = shared_encoders.get(url)
+            if encoder and encoder.joinable():
+                try:
+                    async with timeout(SHARED_SOURCE_READY_TIMEOUT):
+                        await encoder.ready.wait()
+                    if not encoder.failed:
+                        return encoder.subscribe()
+                except asyncio.TimeoutError:
+                    logger.warning(f"Shared encoder for {url} never became ready, starting a new one")
+
+            encoder = SharedEncoder(url)
+            shared_encoders[url] = encoder
+            try:
+                encoder.start(await self.create_ffmpeg_source(url))
+            except BaseException:
+                # Also covers cancellation, so joiners never wait on an encoder that will not start
+                encoder.fail()
+                raise
+            return encoder.subscribe()
 
-                # Create FFmpeg audio source
-                return await discord.FFmpegOpusAudio.from_probe(url, **FFMPEG_OPTIONS)
-                
         except Exception as e:
             logger.error(f"Error creating audio source: {str(e)}")
             await ctx.send(f"❌ Error creating audio source: {str(e)}")
             return None
 
+    async def create_ffmpeg_source(self, url):
+        """Extract the stream URL and start ffmpeg on it"""
+        with yt_dlp.YoutubeDL(YDL_OPTIONS) as ydl:
+            info = await asyncio.to_thread(ydl.extract_info, url, download=False)
+            if not info:
+                raise ValueError("Could not extract audio information")
+            
+            # Get the direct audio URL
+            headers = info.get('http_headers')
+            if 'formats' in info:
+                formats = info['formats']
+                # Try to get best audio-only format
+                audio_formats = [f for f in formats if f.get('acodec') != 'none' and f.get('vcodec') == 'none']
+                if audio_formats:
+                    url = audio_formats[0]['url']
+                    headers = audio_formats[0].get('http_headers', headers)
+                else:
+                    url = info['url']
+            else:
+                url = info['url']
+
+        if READAHEAD_ENABLED:
+            # Fetch through the read-ahead buffer and pipe into ffmpeg
+            buffer = ReadAheadBuffer(url, headers)
+            buffer.start()
+            try:
+                await buffer.wait_ready()
+                return BufferedFFmpegOpusAudio(buffer, **FFMPEG_PIPE_OPTIONS)
+            except BaseException:
+                # Nothing will ever read the buffer, so stop the fetch and free its connection
+                buffer.close()
+                raise
+
+        # Create FFmpeg audio source
+        return await discord.FFmpegOpusAudio.from_probe(url, **FFMPEG_OPTIONS)
+
     async def play_next(self, ctx):
         """Play the next song in queue"""
         try:
@@ -349,7 +1035,16 @@ class MusicPlayer:
                     logger.error(f"Player error: {error}")
                 asyncio.run_coroutine_threadsafe(self.song_finished(ctx, error), bot.loop)
 
-            ctx.voice_client.play(source, after=after_playing)
+            try:
+                ctx.voice_client.play(source, after=after_playing)
+            except Exception:
+                # The after callback will never run, so release the source (and any shared subscription) here
+                source.cleanup()
+                raise
+
+            # Only count tracks that actually started playing
+            if track_index:
+                track_index.record_play(self.current_song.get('video_id'))
 
             # Send now playing embed
             embed = await self.create_now_playing_embed(self.current_song)
@@ -390,11 +1085,11 @@ class MusicPlayer:
                 # Extract track name from URL
                 track_id = url.split('track/')[1].split('?')[0]
                 if self.spotify:
-                    track = self.spotify.track(track_id)
+                    track = await asyncio.to_thread(self.spotify.track, track_id)
                     query = f"{track['name']} {' '.join([artist['name'] for artist in track['artists']])}"
                 else:
                     # Fallback: Extract info from webpage
-                    response = requests.get(url)
+                    response = await asyncio.to_thread(requests.get, url, timeout=10)
                     # Simple extraction of title from page
                     title = response.text.split('<title>')[1].split('</title>')[0]
                     # Clean up the title (remove "- song by" and "| Spotify")
@@ -404,13 +1099,13 @@ class MusicPlayer:
             elif 'album' in url:
                 if not self.spotify:
                     raise Exception("Please provide a direct YouTube link or song name instead of Spotify album URL")
-                album = self.spotify.album(url)
+                album = await asyncio.to_thread(self.spotify.album, url)
                 return [f"{track['name']} {' '.join([artist['name'] for artist in track['artists']])}"
                         for track in album['tracks']['items']]
             elif 'playlist' in url:
                 if not self.spotify:
                     raise Exception("Please provide a direct YouTube link or song name instead of Spotify playlist URL")
-                playlist = self.spotify.playlist(url)
+                playlist = await asyncio.to_thread(self.spotify.playlist, url)
                 return [f"{track['track']['name']} {' '.join([artist['name'] for artist in track['track']['artists']])}"
                         for track in playlist['tracks']['items']]
             else:
@@ -557,6 +1252,30 @@ async def status(ctx):
             value=str(len(bot.guilds)),
             inline=False
         )
+        if READAHEAD_ENABLED:
+            embed.add_field(
+                name="Read-ahead",
+                value=(f"{readahead_stats.streams} streams | "
+                       f"{readahead_stats.bytes_fetched // (1024 * 1024)} MiB fetched | "
+                       f"{readahead_stats.underruns} underruns ({readahead_stats.stall_time:.1f}s stalled) | "
+                       f"{readahead_stats.retries} retries"),
+                inline=False
+            )
+        if track_index and track_index.lookups:
+            embed.add_field(
+                name="Track Index",
+                value=(f"{len(track_index.tracks)} tracks | "
+                       f"{track_index.hits / track_index.lookups:.0%} hit rate | "
+                       f"{track_index.lookup_time / track_index.lookups * 1000:.2f}ms avg lookup"),
+                inline=False
+            )
+        if SHARED_SOURCE_ENABLED:
+            encoders = list(shared_encoders.values())
+            embed.add_field(
+                name="Shared Encoders",
+                value=f"{len(encoders)} tracks | {sum(e.listeners for e in encoders)} listeners",
+                inline=False
+            )
         await ctx.send(embed=embed)
     else:
         await ctx.send("Bot status information not available.")
@@ -611,7 +1330,7 @@ async def leave(ctx):
     if ctx.voice_client:
         await ctx.voice_client.disconnect()
         music_player.queue.clear()
-        music_player.current = None
+        music_player.current_song = None
         music_player.voice_client = None
         await ctx.send("Disconnected 👋")
     else:
@@ -711,37 +1430,205 @@ async def nowplaying(ctx):
 @bot.command(name='queue', aliases=['q'])
 async def queue(ctx):
     """Display the current music queue"""
-    if not music_player.queue and not music_player.current:
+    embed = music_player.create_queue_embed()
+    if not embed:
         await ctx.send("The queue is empty!")
         return
     
+    await ctx.send(embed=embed)
+
+class InteractionContext:
+    """Minimal stand-in for commands.Context so MusicPlayer can serve slash commands"""
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.author = interaction.user
+        self.guild = interaction.guild
+        self.channel = interaction.channel
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def send(self, *args, **kwargs):
+        # Long-lived messages go to the channel, interaction tokens expire after 15 minutes
+        return await self.channel.send(*args, **kwargs)
+
+class ResolveJobs:
+    """Per-guild background queues so slash commands acknowledge before resolving"""
+    def __init__(self):
+        self.queues = {}
+        self.workers = {}
+        self.running = set()
+
+    def pending(self, guild_id):
+        """Number of jobs waiting or running for a guild"""
+        queue = self.queues.get(guild_id)
+        return (queue.qsize() if queue else 0) + (guild_id in self.running)
+
+    def submit(self, guild_id, job):
+        """Queue a coroutine function and start the guild's worker if it is idle"""
+        queue = self.queues.setdefault(guild_id, asyncio.Queue())
+        queue.put_nowait(job)
+        worker = self.workers.get(guild_id)
+        if not worker or worker.done():
+            self.workers[guild_id] = asyncio.create_task(self._worker(guild_id))
+
+    async def _worker(self, guild_id):
+        # Jobs run one at a time so songs are queued in the order they were requested
+        queue = self.queues[guild_id]
+        while not queue.empty():
+            job = queue.get_nowait()
+            self.running.add(guild_id)
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"Error in resolve job: {str(e)}")
+            finally:
+                self.running.discard(guild_id)
+
+resolve_jobs = ResolveJobs()
+
+async def edit_response(interaction, **kwargs):
+    """Edit the deferred response, ignoring failures once the token has expired"""
+    try:
+        await interaction.edit_original_response(**kwargs)
+    except discord.HTTPException as e:
+        logger.error(f"Could not edit interaction response: {str(e)}")
+
+async def play_job(interaction, query):
+    """Resolve a query in the background and report progress on the original response"""
+    ctx = InteractionContext(interaction)
+    try:
+        if not interaction.user.voice:
+            await edit_response(interaction, content="❌ You must be in a voice channel to use this command!", embed=None, view=None)
+            return
+
+        # Join voice channel if not already connected
+        if not ctx.voice_client:
+            await edit_response(interaction, content=f"🔌 Joining {interaction.user.voice.channel.name}...", embed=None, view=None)
+            await interaction.user.voice.channel.connect()
+        elif ctx.voice_client.channel != interaction.user.voice.channel:
+            await ctx.voice_client.move_to(interaction.user.voice.channel)
+
+        await edit_response(interaction, content=f"🔍 Resolving: `{query}`", embed=None, view=None)
+        song_info = await music_player.resolve_url(query, ctx)
+        if not song_info:
+            await edit_response(interaction, content=f"❌ Could not add: `{query}`")
+            return
+
+        await edit_response(interaction, content=None, embed=music_player.create_queued_embed(song_info))
+
+        # Start playing if not already playing
+        if not ctx.voice_client.is_playing():
+            await music_player.play_next(ctx)
+
+    except Exception as e:
+        logger.error(f"Error in play job: {str(e)}")
+        await edit_response(interaction, content=f"❌ Error: {str(e)}", embed=None, view=None)
+
+def submit_play(interaction, query):
+    resolve_jobs.submit(interaction.guild_id, lambda: play_job(interaction, query))
+
+class SearchResultsView(View):
+    def __init__(self, interaction, results):
+        super().__init__(timeout=30)
+        self.interaction = interaction
+        self.results = results
+        select = Select(
+            placeholder="Choose a song",
+            options=[discord.SelectOption(label=f"{i}. {result['title']}"[:100], value=str(i - 1))
+                     for i, result in enumerate(results, 1)]
+        )
+        select.callback = self.select_callback
+        self.add_item(select)
+
+    async def select_callback(self, interaction: discord.Interaction):
+        if interaction.user != self.interaction.user:
+            await interaction.response.send_message("❌ Only the person who searched can choose!", ephemeral=True)
+            return
+        if not interaction.user.voice:
+            await interaction.response.send_message("❌ You must be in a voice channel to use this command!", ephemeral=True)
+            return
+        await interaction.response.defer()
+        self.stop()
+        selected_song = self.results[int(interaction.data['values'][0])]
+        submit_play(self.interaction, selected_song['url'])
+
+    async def on_timeout(self):
+        await edit_response(self.interaction, content="⏱️ Search timed out!", embed=None, view=None)
+
+async def search_job(interaction, query):
+    """Search in the background and replace the deferred response with the results"""
+    results = await music_player.search_youtube(query, limit=5)
+    if not results:
+        await edit_response(interaction, content="❌ No results found!")
+        return
+
     embed = discord.Embed(
-        title="Music Queue",
+        title="🎵 Search Results",
+        description="Pick a song from the menu below.",
         color=discord.Color.blue()
     )
-    
-    if music_player.current:
+    for i, result in enumerate(results, 1):
         embed.add_field(
-            name="Now Playing",
-            value=f"[{music_player.current['title']}]({music_player.current['webpage_url']})",
+            name=f"{i}. {result['title']}",
+            value=f"Channel: {result['channel']} | Duration: {result['duration']}",
             inline=False
         )
-    
-    if music_player.queue:
-        queue_text = ""
-        for i, song in enumerate(music_player.queue, 1):
-            if i > 10:  # Show only first 10 songs
-                queue_text += f"\nAnd {len(music_player.queue) - 10} more songs..."
-                break
-            queue_text += f"\n{i}. [{song['title']}]({song['webpage_url']})"
-        
-        embed.add_field(
-            name="Up Next",
-            value=queue_text if queue_text else "No songs in queue",
-            inline=False
-        )
-    
-    await ctx.send(embed=embed)
+    await edit_response(interaction, content=None, embed=embed, view=SearchResultsView(interaction, results))
+
+@bot.tree.command(name='play', description='Play a song from URL or search query')
+@app_commands.guild_only()
+@app_commands.describe(query='Song URL or search terms')
+async def slash_play(interaction: discord.Interaction, query: str):
+    """Acknowledge at once and resolve the song in the background"""
+    await interaction.response.defer(thinking=True)
+    if not interaction.user.voice:
+        await edit_response(interaction, content="❌ You must be in a voice channel to use this command!")
+        return
+
+    pending = resolve_jobs.pending(interaction.guild_id)
+    if pending:
+        await edit_response(interaction, content=f"⏳ Waiting behind {pending} request(s): `{query}`")
+    submit_play(interaction, query)
+
+@bot.tree.command(name='search', description='Search for a song on YouTube')
+@app_commands.guild_only()
+@app_commands.describe(query='Search terms')
+async def slash_search(interaction: discord.Interaction, query: str):
+    """Acknowledge at once and search in the background"""
+    await interaction.response.defer(thinking=True)
+    await edit_response(interaction, content=f"🔍 Searching for: `{query}`")
+    resolve_jobs.submit(interaction.guild_id, lambda: search_job(interaction, query))
+
+@bot.tree.command(name='queue', description='Display the current music queue')
+@app_commands.guild_only()
+async def slash_queue(interaction: discord.Interaction):
+    """Display the current music queue"""
+    await interaction.response.defer()
+    embed = music_player.create_queue_embed()
+    if not embed:
+        await edit_response(interaction, content="The queue is empty!")
+        return
+
+    pending = resolve_jobs.pending(interaction.guild_id)
+    if pending:
+        embed.set_footer(text=f"{pending} request(s) still resolving")
+
+    await edit_response(interaction, embed=embed)
+
+@bot.tree.command(name='skip', description='Skip the current song')
+@app_commands.guild_only()
+async def slash_skip(interaction: discord.Interaction):
+    """Skip the current song"""
+    await interaction.response.defer()
+    voice_client = interaction.guild.voice_client
+    if voice_client and (voice_client.is_playing() or voice_client.is_paused()):
+        # Stopping fires the after callback, which starts the next song
+        voice_client.stop()
+        await edit_response(interaction, content="Skipped ⏭️")
+    else:
+        await edit_response(interaction, content="Nothing to skip!")
 
 # Run the bot
 bot.run(os.getenv('DISCORD_TOKEN'))